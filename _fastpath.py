@@ -0,0 +1,155 @@
+"""Output extraction and cell serialization hot path.
+
+This module is plain Python. It can be compiled with mypyc
+(``python setup.py build_ext --inplace``). The compiled extension then
+takes precedence over this file at import time. Keep it free of
+dependencies and fully annotated so mypyc can compile it.
+"""
+import os
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple, Union
+
+MAX_OUTPUT_CHARS = int(os.getenv("MAX_OUTPUT_CHARS", str(64 * 1024)))
+
+# Error outputs keep their traceback as a list of lines
+OutputText = Union[str, List[str]]
+
+def truncate_output(text: Any) -> str:
+    """Joins multiline output text and truncates it to MAX_OUTPUT_CHARS."""
+    # nbformat allows multiline strings to be stored as a list of lines, and
+    # jupyter_ydoc stores the text of loaded stream outputs as a y-text
+    if isinstance(text, list):
+        text = "".join(text)
+    elif not isinstance(text, str):
+        text = str(text)
+    if len(text) <= MAX_OUTPUT_CHARS:
+        return text
+    return text[:MAX_OUTPUT_CHARS] + "…[truncated]"
+
+# Mime types rendered for rich outputs, in order of preference
+MIME_PRIORITY: Tuple[Tuple[str, Callable[[Mapping[str, Any]], str]], ...] = (
+    ("text/plain", lambda data: truncate_output(data["text/plain"])),
+    ("text/html", lambda data: "[HTML Output]"),
+    ("image/png", lambda data: "[Image Output (PNG)]"),
+)
+
+def extract_data_output(output: Mapping[str, Any]) -> OutputText:
+    """Renders a display_data / execute_result output using the first known mime type."""
+    data = output.get("data", {})
+    for mime_type, render in MIME_PRIORITY:
+        if mime_type in data:
+            return render(data)
+    return f"[{output['output_type']} Data: keys={list(data.keys())}]"
+
+def extract_unknown_output(output: Mapping[str, Any]) -> OutputText:
+    """Renders an output whose type is not handled."""
+    return f"[Unknown output type: {output.get('output_type')}]"
+
+def extract_stream_output(output: Mapping[str, Any]) -> OutputText:
+    """Renders a stream output."""
+    return truncate_output(output.get("text", ""))
+
+def extract_error_output(output: Mapping[str, Any]) -> OutputText:
+    """Renders an error output as its traceback lines."""
+    return list(output["traceback"])
+
+# Output renderers keyed by output type
+OUTPUT_HANDLERS: Dict[str, Callable[[Mapping[str, Any]], OutputText]] = {
+    "stream": extract_stream_output,
+    "display_data": extract_data_output,
+    "execute_result": extract_data_output,
+    "error": extract_error_output,
+}
+
+def extract_output(output: Mapping[str, Any]) -> OutputText:
+    """
+    Extracts readable output from a Jupyter cell output dictionary.
+    Args:
+        output (dict): The output dictionary from a Jupyter cell.
+    Returns:
+        str: A string representation of the output, the traceback lines for errors.
+    """
+    return OUTPUT_HANDLERS.get(output.get("output_type", ""), extract_unknown_output)(output)
+
+def serialize_cell(
+    ycell: Any,
+    extract: Optional[Callable[[Any], Any]] = extract_output,
+    last_outputs: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Serializes a notebook cell into a plain dictionary.
+    Args:
+        ycell: The y-map of the cell, or its detached plain dictionary.
+        extract: Renders each output of a code cell; None leaves the outputs out.
+        last_outputs: Only keep this many of the most recent outputs, all when None.
+    Returns:
+        dict: The cell type, source and, for code cells, the readable outputs.
+    """
+    cell_type = ycell["cell_type"]
+    cell: Dict[str, Any] = {
+        "type": cell_type,
+        "content": str(ycell["source"])
+    }
+    # For code cells, include outputs
+    if cell_type == "code" and extract is not None:
+        outputs = ycell["outputs"]
+        if last_outputs is not None:
+            # Explicit bounds, y-arrays do not support negative slice indices
+            outputs = outputs[max(len(outputs) - last_outputs, 0):] if last_outputs > 0 else []
+        cell["outputs"] = [extract(output) for output in outputs]
+    return cell
+
+def detach_value(value: Any) -> Any:
+    """Converts a y-document value to plain Python, other values are returned as is."""
+    to_py = getattr(value, "to_py", None)
+    return to_py() if to_py is not None else value
+
+def detach_output(output: Any) -> Dict[str, Any]:
+    """
+    Copies the fields of an output read by extract_output.
+    Args:
+        output: The y-map of the output.
+    Returns:
+        dict: The output type, text, traceback and mime types. Only the
+        text/plain payload is copied, the others are rendered as placeholders.
+    """
+    detached: Dict[str, Any] = {"output_type": output.get("output_type")}
+    for key in ("text", "traceback"):
+        value = output.get(key)
+        if value is not None:
+            detached[key] = detach_value(value)
+    data = output.get("data")
+    if data is not None:
+        detached["data"] = {
+            mime_type: detach_value(data[mime_type]) if mime_type == "text/plain" else None
+            for mime_type in data.keys()
+        }
+    return detached
+
+def detach_cell(ycell: Any) -> Dict[str, Any]:
+    """
+    Copies the fields of a cell read by serialize_cell, so it can be
+    serialized away from the thread owning the y-document.
+    Args:
+        ycell: The y-map of the cell.
+    Returns:
+        dict: The cell type, source and, for code cells, the detached outputs.
+    """
+    cell_type = ycell["cell_type"]
+    cell: Dict[str, Any] = {
+        "cell_type": cell_type,
+        "source": str(ycell["source"])
+    }
+    if cell_type == "code":
+        cell["outputs"] = [detach_output(output) for output in ycell["outputs"]]
+    return cell
+
+def serialize_cells(cells: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Serializes a chunk of notebook cells detached from the y-document.
+    Args:
+        cells (list): The cells copied by detach_cell.
+    Returns:
+        list: The serialized cells, in the same order.
+    """
+    serialize = serialize_cell
+    return [serialize(cell) for cell in cells]
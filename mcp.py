@@ -1,101 +1,454 @@
 import os
 import sys
+import queue
+import atexit
+import json
 import asyncio
+import hashlib
 import logging
-from typing import List, Dict, Any, Optional
+from logging.handlers import QueueHandler, QueueListener
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from functools import partial
+from typing import List, Dict, Any, AsyncIterator, Optional, Tuple
 
 from mcp.server.fastmcp import FastMCP
 
+from websockets.asyncio.client import connect as websocket_connect
+from websockets.exceptions import ConnectionClosed
+
+from nbformat import v4 as nbformat_v4
+from pycrdt import MapEvent
+
+# Output extraction hot path, compiled with mypyc when built (see setup.py)
+from _fastpath import detach_cell, extract_output, serialize_cell, serialize_cells
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 from jupyter_kernel_client import KernelClient
+from jupyter_kernel_client.client import output_hook
+import jupyter_nbmodel_client.client as nbmodel_client_module
 from jupyter_nbmodel_client import (
     NbModelClient,
     get_jupyter_notebook_websocket_url,
 )
+from jupyter_nbmodel_client.model import save_in_notebook_hook
 
-# Set up logging
+# Set up logging - records are written to stderr by a background listener
+# thread so the event loop never blocks on the stderr lock. QueueHandler formats
+# the record in the logging thread before queueing it, hence the lazy %s
+# arguments that skip disabled levels entirely
+log_queue: queue.SimpleQueue = queue.SimpleQueue()
+log_listener = QueueListener(log_queue, logging.StreamHandler(sys.stderr))
+log_listener.start()
+atexit.register(log_listener.stop)
+queue_handler = QueueHandler(log_queue)
+queue_handler.setFormatter(logging.Formatter('%(asctime)s [%(levelname)s] %(message)s'))
+LOG_LEVEL = os.getenv("LOG_LEVEL", "WARNING").upper()
+# getLevelName returns a number only for the known level names
+log_level_known = isinstance(logging.getLevelName(LOG_LEVEL), int)
 logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s [%(levelname)s] %(message)s',
+    level=LOG_LEVEL if log_level_known else logging.WARNING,
     handlers=[
-        logging.StreamHandler(sys.stderr)
+        queue_handler
     ]
 )
 logger = logging.getLogger("jupyter_mcp")
-
-# Initialize FastMCP server
-mcp = FastMCP("jupyter")
+if not log_level_known:
+    logger.warning("Unknown LOG_LEVEL %s, using WARNING", LOG_LEVEL)
 
 # Environment setup
 NOTEBOOK_PATH = os.getenv("NOTEBOOK_PATH", "notebook.ipynb")
 SERVER_URL = os.getenv("SERVER_URL", "http://localhost:8888")
 TOKEN = os.getenv("TOKEN", "MY_TOKEN")
+EXECUTION_TIMEOUT = float(os.getenv("EXECUTION_TIMEOUT", "30"))  # seconds
+# Number of changed cells serialized per worker thread when reading the notebook
+SERIALIZE_CHUNK_SIZE = 64
+
+# Connection errors worth reconnecting for, anything else is reported right away
+RETRYABLE_ERRORS = (ConnectionClosed, ConnectionError, asyncio.TimeoutError)
+RETRY_BASE_DELAY = 0.05  # seconds, doubled after each failed attempt
+
+# Cell builders used by add_cells, keyed by cell type
+CELL_FACTORIES = {
+    "markdown": nbformat_v4.new_markdown_cell,
+    "code": nbformat_v4.new_code_cell,
+}
+
+# nbformat outputs of opt-in cached executions keyed by (kernel id, code digest), least recent first
+execution_cache: "OrderedDict[Tuple[Optional[str], str], List[Dict[str, Any]]]" = OrderedDict()
+EXECUTION_CACHE_SIZE = 256
 
-# Initialize the kernel client
-logger.info(f"Initializing kernel client with SERVER_URL={SERVER_URL}")
-kernel = KernelClient(server_url=SERVER_URL, token=TOKEN)
-kernel.start()
-logger.info("Kernel client started successfully")
+# Global kernel client - started on first use so server startup is not blocked
+kernel: Optional[KernelClient] = None
+kernel_lock = asyncio.Lock()
 
-# Global notebook client - reuse connection
+# NbModelClient does not expose its websocket options. Disable permessage-deflate
+# on its connections: the Jupyter server is local, so compressing every y-doc
+# update only costs CPU
+nbmodel_client_module.connect = partial(websocket_connect, compression=None)
+
+async def ensure_kernel() -> KernelClient:
+    """Start the kernel client once and return it."""
+    global kernel
+    async with kernel_lock:
+        if kernel is None:
+            logger.info("Initializing kernel client with SERVER_URL=%s", SERVER_URL)
+            client = KernelClient(server_url=SERVER_URL, token=TOKEN)
+            await asyncio.to_thread(client.start)
+            kernel = client
+            logger.info("Kernel client started successfully")
+        return kernel
+
+# Global notebook client - one long-lived connection shared by all tool calls
 notebook_client: Optional[NbModelClient] = None
+# Serializes (re)connections so concurrent tool calls never open a second websocket
+connection_lock = asyncio.Lock()
+# Serializes y-document mutations issued by the tools
+notebook_lock = asyncio.Lock()
+
+# Websocket URL of the notebook room, reused across reconnections
+notebook_ws_url: Optional[str] = None
+
+async def get_notebook_ws_url() -> str:
+    """Get the notebook websocket URL, requesting a collaboration session only once."""
+    global notebook_ws_url
+    if notebook_ws_url is None:
+        # The helper issues a blocking HTTP request to open the session
+        notebook_ws_url = await asyncio.to_thread(
+            get_jupyter_notebook_websocket_url, server_url=SERVER_URL, token=TOKEN, path=NOTEBOOK_PATH
+        )
+    return notebook_ws_url
 
 async def get_notebook_client():
     """Get or create a notebook client with connection reuse."""
+    global notebook_client, notebook_ws_url
+    async with connection_lock:
+        try:
+            if notebook_client is None:
+                logger.info("Creating new notebook client")
+                client = NbModelClient(await get_notebook_ws_url())
+                await client.start()
+                if not client.synced:
+                    await client.stop()
+                    raise ConnectionError(f"Notebook {NOTEBOOK_PATH} could not be synced")
+                track_cell_changes(client)
+                notebook_client = client
+                logger.info("Notebook client connected successfully")
+            return notebook_client
+        except Exception as e:
+            logger.error("Error creating notebook client: %s", e)
+            notebook_client = None
+            # The session may be gone (e.g. Jupyter server restarted), request a new one next time
+            notebook_ws_url = None
+            raise
+
+async def reset_notebook_connection(client: Optional[NbModelClient]):
+    """Stop a notebook client so the next call reconnects.
+
+    Nothing is done when the client was already replaced, e.g. by a concurrent
+    call that found it broken first and reconnected.
+    Args:
+        client (NbModelClient): The client to drop, None if there is none.
+    """
     global notebook_client
+    async with connection_lock:
+        if client is None or client is not notebook_client:
+            return
+        notebook_client = None
     try:
-        if notebook_client is None:
-            logger.info("Creating new notebook client")
-            notebook_client = NbModelClient(
-                get_jupyter_notebook_websocket_url(server_url=SERVER_URL, token=TOKEN, path=NOTEBOOK_PATH)
-            )
-            await notebook_client.start()
-            logger.info("Notebook client connected successfully")
-        return notebook_client
+        await client.stop()
     except Exception as e:
-        logger.error(f"Error creating notebook client: {str(e)}")
-        notebook_client = None
-        raise
+        logger.warning("Error stopping notebook client: %s", e)
 
 async def ensure_notebook_connection():
     """Ensure notebook client is connected, reconnect if needed."""
-    global notebook_client
+    client = notebook_client
+    if client is None:
+        return await get_notebook_client()
+
+    # The client drops its synced flag as soon as the websocket is closed
+    if not client.synced:
+        logger.warning("Notebook connection lost, reconnecting")
+        await reset_notebook_connection(client)
+        return await get_notebook_client()
+    return client
+
+# Serialized cells keyed by cell id, with the cell version they were built from
+cell_cache: Dict[str, Tuple[int, Dict[str, Any]]] = {}
+# Per cell change counter, bumped by the y-document observer
+cell_versions: Dict[str, int] = {}
+# Whole notebook change counter and the last snapshot built from it, shared by
+# concurrent read_notebook_content calls
+notebook_version = 0
+notebook_snapshot: Optional[Tuple[int, str]] = None
+snapshot_lock = asyncio.Lock()
+# Executions waiting for their cell to go back to idle, keyed by cell id
+pending_executions: Dict[str, asyncio.Future] = {}
+
+def resolve_execution(finished: asyncio.Future):
+    """Mark a pending cell execution as finished."""
+    if not finished.done():
+        finished.set_result(None)
+
+def track_cell_changes(notebook: NbModelClient):
+    """Observe the notebook cells to invalidate their cached serialization
+    and to resolve the pending executions.
+    Args:
+        notebook (NbModelClient): The freshly connected notebook client.
+    """
+    global notebook_snapshot, notebook_version
+    cell_cache.clear()
+    cell_versions.clear()
+    # A read still building a snapshot of the previous document must not
+    # store it as current
+    notebook_version += 1
+    notebook_snapshot = None
+    ycells = notebook._doc._ycells
+
+    def on_cells_change(events):
+        global notebook_version
+        notebook_version += 1
+        # A single transaction often touches several parts of the same cell
+        # (outputs, execution count, state), look each cell up only once
+        touched = {}
+        for event in events:
+            if event.path:
+                # Nested change, the path starts with the index of the cell
+                index = event.path[0]
+                if index not in touched:
+                    touched[index] = ycells[index]
+                changed = [touched[index]]
+            else:
+                # Structural change, only the inserted cells are new; a cell
+                # re-inserted with the same id must not reuse its old entry
+                changed = [ycell for delta in event.delta for ycell in delta.get("insert", ())]
+            for ycell in changed:
+                cell_id = ycell.get("id")
+                cell_versions[cell_id] = cell_versions.get(cell_id, 0) + 1
+
+            # The execution of a cell is over once its state is back to idle
+            if isinstance(event, MapEvent) and len(event.path) == 1:
+                change = event.keys.get("execution_state")
+                if change and change.get("newValue") == "idle":
+                    finished = pending_executions.get(changed[0].get("id"))
+                    if finished is not None:
+                        resolve_execution(finished)
+
+    ycells.observe_deep(on_cells_change)
+
+@asynccontextmanager
+async def server_lifespan(server: FastMCP) -> AsyncIterator[None]:
+    """Connect the notebook client once at server boot and close it at shutdown.
+
+    The kernel is started in the background, overlapping the MCP handshake;
+    the first tool that needs it waits for it through ensure_kernel.
+    """
+    def on_kernel_started(task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning("Kernel not started at startup, will retry on first use: %s", task.exception())
+
+    kernel_startup = asyncio.create_task(ensure_kernel())
+    kernel_startup.add_done_callback(on_kernel_started)
     try:
-        if notebook_client is None:
-            return await get_notebook_client()
-        
-        # Test connection by trying to access the document
-        _ = notebook_client._doc
-        return notebook_client
+        await get_notebook_client()
     except Exception as e:
-        logger.warning(f"Notebook connection lost, reconnecting: {str(e)}")
-        notebook_client = None
-        return await get_notebook_client()
+        logger.warning("Notebook client not connected at startup, will retry on first use: %s", e)
+    try:
+        yield
+    finally:
+        kernel_startup.cancel()
+        await reset_notebook_connection(notebook_client)
+
+# Initialize FastMCP server
+mcp = FastMCP("jupyter", lifespan=server_lifespan)
 
-def extract_output(output: dict) -> str:
+def dump_json(content: Any) -> str:
+    """Encodes a tool result as JSON text, with orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(content).decode()
+    return json.dumps(content)
+
+async def snapshot_notebook(notebook: NbModelClient) -> Dict[str, Any]:
     """
-    Extracts readable output from a Jupyter cell output dictionary.
+    Serializes all the notebook cells, reusing the cached entries of unchanged cells.
+
+    When many cells changed, they are serialized in chunks from worker threads
+    so the event loop keeps serving the websocket and the other tools.
     Args:
-        output (dict): The output dictionary from a Jupyter cell.
+        notebook (NbModelClient): The connected notebook client.
     Returns:
-        str: A string representation of the output.
+        dict: The notebook content structure containing the cells and their count.
     """
-    output_type = output.get("output_type")
-    if output_type == "stream":
-        return output.get("text", "")
-    elif output_type in ["display_data", "execute_result"]:
-        data = output.get("data", {})
-        if "text/plain" in data:
-            return data["text/plain"]
-        elif "text/html" in data:
-            return "[HTML Output]"
-        elif "image/png" in data:
-            return "[Image Output (PNG)]"
+    global cell_cache
+    # Get the y-document which contains the notebook content
+    ydoc = notebook._doc
+    current_cache = {}
+    cells = []
+    stale = []
+    for i, ycell in enumerate(ydoc._ycells):
+        cell_id = ycell.get("id")
+        version = cell_versions.get(cell_id, 0)
+        cached = cell_cache.get(cell_id)
+        if cached is not None and cached[0] == version:
+            cells.append(cached[1])
+            current_cache[cell_id] = cached
         else:
-            return f"[{output_type} Data: keys={list(data.keys())}]"
-    elif output_type == "error":
-        return output["traceback"]
+            cells.append(None)
+            stale.append((i, cell_id, version, ycell))
+
+    if len(stale) <= SERIALIZE_CHUNK_SIZE:
+        serialized = [serialize_cell(ycell) for *_, ycell in stale]
     else:
-        return f"[Unknown output type: {output_type}]"
+        # The y-document must only be read from the event loop thread, detach
+        # the fields the serialization reads before handing them to the
+        # workers; rich payloads such as images are never copied
+        detached = [detach_cell(ycell) for *_, ycell in stale]
+        chunks = await asyncio.gather(*(
+            asyncio.to_thread(serialize_cells, detached[start:start + SERIALIZE_CHUNK_SIZE])
+            for start in range(0, len(detached), SERIALIZE_CHUNK_SIZE)
+        ))
+        serialized = [cell for chunk in chunks for cell in chunk]
+
+    for (i, cell_id, version, _), cell in zip(stale, serialized):
+        cells[i] = cell
+        if cell_id is not None:
+            current_cache[cell_id] = (version, cell)
+    # A reconnection while the workers ran has reset the cache for the new document
+    if notebook is notebook_client:
+        cell_cache = current_cache
+
+    cells = [{"index": i, **cell} for i, cell in enumerate(cells)]
+    return {
+        "cells": cells,
+        "total_cells": len(cells)
+    }
+
+def extract_image_output(output: Any) -> Any:
+    """
+    Extracts readable output, keeping the PNG image data.
+    Args:
+        output: The output of a Jupyter cell.
+    Returns:
+        The output rendered by extract_output, or {"image/png": <base64 data>}
+        so images can be told apart from text outputs.
+    """
+    data = output.get("data")
+    if data and "image/png" in data:
+        return {"image/png": data["image/png"]}
+    return extract_output(output)
+
+def execution_cache_key(kernel_client: KernelClient, cell_content: str) -> Tuple[Optional[str], str]:
+    """Keys a cached execution on the kernel running it and a digest of the code."""
+    digest = hashlib.blake2b(cell_content.encode(), digest_size=16).hexdigest()
+    return (kernel_client.id, digest)
+
+def write_cell_outputs(notebook: NbModelClient, cell_index: int, outputs: List[Dict[str, Any]]):
+    """Writes nbformat outputs into a cell, as a single y-document update."""
+    ycell = notebook._doc._ycells[cell_index]
+    with notebook._lock:
+        with ycell.doc.transaction(origin=notebook._changes_origin):
+            ycell["outputs"].extend(outputs)
+
+async def wait_or_interrupt(kernel_client: KernelClient, execution: asyncio.Future, *signals: asyncio.Future) -> bool:
+    """Wait for a kernel request, interrupting the kernel after EXECUTION_TIMEOUT.
+
+    The kernel client does not check its own timeout while it waits for
+    outputs, so the request is sent without one and the deadline is kept here.
+    After an interrupt the request thread ends with the kernel's idle status.
+    Args:
+        kernel_client (KernelClient): The kernel running the code.
+        execution (asyncio.Future): The worker thread running the request.
+        signals (asyncio.Future): Other futures telling that the execution is over.
+    Returns:
+        bool: Whether the execution finished before the timeout.
+    """
+    done, _ = await asyncio.wait(
+        {execution, *signals}, timeout=EXECUTION_TIMEOUT, return_when=asyncio.FIRST_COMPLETED
+    )
+    if not done:
+        logger.warning("Execution still running after %ss, interrupting the kernel", EXECUTION_TIMEOUT)
+        try:
+            await asyncio.to_thread(kernel_client.interrupt)
+        except Exception as e:
+            logger.warning("Error interrupting the kernel: %s", e)
+        return False
+    if execution.done() and execution.exception() is not None:
+        raise execution.exception()
+    return True
+
+async def execute_cell_and_wait(notebook: NbModelClient, cell_index: int, kernel_client: KernelClient) -> Tuple[Any, bool]:
+    """Execute a cell and wait until its execution state returns to idle.
+
+    The pending execution is resolved by the y-document observer, so the call
+    returns as soon as the kernel is done, instead of polling the outputs.
+    pycrdt transactions cannot cross threads, so only the blocking kernel
+    request runs in a worker thread; the messages it receives are written to
+    the cell from the event loop.
+    Args:
+        notebook (NbModelClient): The connected notebook client.
+        cell_index (int): Index of the cell to execute.
+        kernel_client (KernelClient): The kernel to execute the cell with.
+    Returns:
+        The y-array holding the cell outputs, and whether the execution
+        finished before the timeout.
+    """
+    loop = asyncio.get_running_loop()
+    ycell = notebook._doc._ycells[cell_index]
+    origin = notebook._changes_origin
+    outputs = []
+
+    def update_cell(**fields):
+        # Same lock and origin as the writes of jupyter_nbmodel_client
+        with notebook._lock:
+            with ycell.doc.transaction(origin=origin):
+                ycell.update(fields)
+
+    def on_kernel_message(msg):
+        msg_type = msg["header"]["msg_type"]
+        if msg_type == "execute_input":
+            update_cell(execution_count=msg["content"]["execution_count"])
+        elif msg_type == "status":
+            if msg["content"]["execution_state"] == "idle":
+                update_cell(execution_state="idle")
+        else:
+            save_in_notebook_hook(notebook._lock, outputs, ycell, origin, msg)
+
+    with notebook._lock:
+        source = ycell["source"].to_py()
+        with ycell.doc.transaction(origin=origin):
+            del ycell["outputs"][:]
+            ycell["execution_count"] = None
+            ycell["execution_state"] = "running"
+
+    cell_id = ycell["id"]
+    idle = loop.create_future()
+    pending_executions[cell_id] = idle
+    try:
+        # execute_interactive blocks until the kernel replies, keep it off the event loop
+        execution = asyncio.ensure_future(asyncio.to_thread(
+            kernel_client.execute_interactive,
+            source,
+            output_hook=partial(loop.call_soon_threadsafe, on_kernel_message),
+            allow_stdin=False,
+            timeout=None,
+        ))
+        try:
+            finished = await wait_or_interrupt(kernel_client, execution, idle)
+        except Exception:
+            # The request failed, no idle status will come from the kernel
+            update_cell(execution_state="idle")
+            raise
+    finally:
+        pending_executions.pop(cell_id, None)
+
+    if not finished:
+        # The cell stays running until the interrupted kernel goes back to idle
+        logger.warning("Returning partial outputs of cell %s", cell_index)
+    return ycell["outputs"], finished
 
 @mcp.tool()
 async def add_markdown_cell(cell_content: str) -> str:
@@ -111,47 +464,83 @@ async def add_markdown_cell(cell_content: str) -> str:
     max_retries = 3
     
     for attempt in range(max_retries):
+        notebook = None
         try:
-            logger.info(f"Markdown cell addition attempt {attempt + 1}/{max_retries}")
+            logger.info("Markdown cell addition attempt %s/%s", attempt + 1, max_retries)
             notebook = await ensure_notebook_connection()
             
             # Add the markdown cell
-            cell_index = notebook.add_markdown_cell(cell_content)
-            logger.info(f"Markdown cell added at index {cell_index}")
+            async with notebook_lock:
+                cell_index = notebook.add_markdown_cell(cell_content)
+            logger.info("Markdown cell added at index %s", cell_index)
             
-            # Wait for the operation to complete
-            await asyncio.sleep(0.5)
-            
-            # Verify the cell was added
-            ydoc = notebook._doc
-            if cell_index < len(ydoc._ycells):
-                cell_type = ydoc._ycells[cell_index]["cell_type"]
+            # The y-doc transaction is applied synchronously, verify the cell right away
+            ycells = notebook._doc._ycells
+            if cell_index < len(ycells):
+                cell_type = ycells[cell_index]["cell_type"]
                 if cell_type == "markdown":
                     logger.info("Markdown cell verified successfully")
                     return "Jupyter Markdown cell added."
                 else:
-                    logger.warning(f"Cell at index {cell_index} has type {cell_type}, not markdown")
+                    logger.warning("Cell at index %s has type %s, not markdown", cell_index, cell_type)
             
             logger.info("Markdown cell added successfully")
             return "Jupyter Markdown cell added."
             
-        except Exception as e:
-            logger.error(f"Attempt {attempt + 1} failed for markdown cell: {str(e)}")
+        except RETRYABLE_ERRORS as e:
+            logger.error("Attempt %s failed for markdown cell: %s", attempt + 1, e)
             if attempt < max_retries - 1:
                 logger.info("Retrying markdown cell addition...")
-                # Reset connection on error
-                global notebook_client
-                notebook_client = None
-                await asyncio.sleep(1)
+                # Reset connection on error, unless another call already replaced it
+                await reset_notebook_connection(notebook)
+                await asyncio.sleep(RETRY_BASE_DELAY * 2 ** attempt)
             else:
                 return f"Error adding markdown cell after {max_retries} attempts: {str(e)}"
+        except Exception as e:
+            logger.error("Error adding markdown cell: %s", e)
+            return f"Error adding markdown cell: {str(e)}"
+
+@mcp.tool()
+async def add_cells(cells: List[Dict[str, str]]) -> str:
+    """Add several cells to a Jupyter notebook at once, without executing them.
+    
+    Args:
+        cells: Cells to add in order, each with a "type" ("markdown" or "code") and a "content"
+    
+    Returns:
+        str: Success message
+    """
+    logger.info("Adding %s cells", len(cells))
+    try:
+        new_cells = []
+        for cell in cells:
+            new_cell = CELL_FACTORIES.get(cell.get("type"))
+            if new_cell is None:
+                return f"Error adding cells: unknown cell type {cell.get('type')!r}"
+            new_cells.append(new_cell(cell.get("content", "")))
+        
+        notebook = await ensure_notebook_connection()
+        async with notebook_lock:
+            # A single transaction, so all the cells are sent in one y-doc update
+            with notebook._lock:
+                with notebook._doc._ydoc.transaction(origin=notebook._changes_origin):
+                    for new_cell in new_cells:
+                        notebook._doc.append_cell(new_cell)
+        
+        logger.info("%s cells added", len(new_cells))
+        return f"{len(new_cells)} Jupyter cells added."
+    except Exception as e:
+        logger.error("Error adding cells: %s", e)
+        return f"Error adding cells: {str(e)}"
 
 @mcp.tool()
-async def add_execute_code_cell(cell_content: str) -> List[str]:
+async def add_execute_code_cell(cell_content: str, cache: bool = False) -> List[str]:
     """Add and execute a code cell in a Jupyter notebook.
     
     Args:
         cell_content: Python code to execute
+        cache: Write the outputs of a previous execution of the same code in the
+            current kernel into the new cell instead of running it again; only for code without side effects
     
     Returns:
         list[str]: List of outputs from the executed cell
@@ -160,106 +549,165 @@ async def add_execute_code_cell(cell_content: str) -> List[str]:
     max_retries = 3
     
     for attempt in range(max_retries):
+        notebook = None
         try:
-            logger.info(f"Code cell execution attempt {attempt + 1}/{max_retries}")
+            logger.info("Code cell execution attempt %s/%s", attempt + 1, max_retries)
             notebook = await ensure_notebook_connection()
+            # The cache is keyed on the kernel that runs the code, even if a
+            # restart replaces it meanwhile
+            kernel_client = await ensure_kernel()
+            cache_key = execution_cache_key(kernel_client, cell_content) if cache else None
             
             # Add the code cell
-            cell_index = notebook.add_code_cell(cell_content)
-            logger.info(f"Code cell added at index {cell_index}, executing...")
+            async with notebook_lock:
+                cell_index = notebook.add_code_cell(cell_content)
             
-            # Execute the cell
-            notebook.execute_cell(cell_index, kernel)
+            cached = execution_cache.get(cache_key) if cache_key is not None else None
+            if cached is not None:
+                execution_cache.move_to_end(cache_key)
+                write_cell_outputs(notebook, cell_index, cached)
+                logger.info("Code cell added at index %s with cached outputs", cell_index)
+                return [extract_output(output) for output in cached]
+            logger.info("Code cell added at index %s, executing...", cell_index)
             
-            # Wait for execution with progressive checking
-            max_wait_time = 30  # seconds
-            check_interval = 0.5  # seconds
-            waited = 0
-            
-            while waited < max_wait_time:
-                await asyncio.sleep(check_interval)
-                waited += check_interval
-                
-                try:
-                    ydoc = notebook._doc
-                    if cell_index < len(ydoc._ycells):
-                        outputs = ydoc._ycells[cell_index]["outputs"]
-                        if outputs:  # Has outputs, execution likely complete
-                            break
-                except Exception as e:
-                    logger.warning(f"Error checking outputs during wait: {str(e)}")
-                
-                if waited % 5 == 0:  # Log every 5 seconds
-                    logger.info(f"Still waiting for execution... ({waited}s)")
-            
-            # Get final outputs
-            ydoc = notebook._doc
-            outputs = ydoc._ycells[cell_index]["outputs"]
+            # Execute the cell and wait for the completion signal
+            outputs, finished = await execute_cell_and_wait(notebook, cell_index, kernel_client)
             str_outputs = [extract_output(output) for output in outputs]
             
-            logger.info(f"Code cell execution complete, got {len(str_outputs)} outputs")
+            # Failed or timed out executions are not cached, they are usually retried;
+            # neither are the outputs of a kernel restarted meanwhile
+            if (cache_key is not None and finished and kernel is kernel_client
+                    and all(output.get("output_type") != "error" for output in outputs)):
+                execution_cache[cache_key] = outputs.to_py()
+                if len(execution_cache) > EXECUTION_CACHE_SIZE:
+                    execution_cache.popitem(last=False)
+            
+            logger.info("Code cell execution complete, got %s outputs", len(str_outputs))
             return str_outputs
             
-        except Exception as e:
-            logger.error(f"Attempt {attempt + 1} failed for code cell: {str(e)}")
+        except RETRYABLE_ERRORS as e:
+            logger.error("Attempt %s failed for code cell: %s", attempt + 1, e)
             if attempt < max_retries - 1:
                 logger.info("Retrying code cell execution...")
-                # Reset connection on error
-                global notebook_client
-                notebook_client = None
-                await asyncio.sleep(1)
+                # Reset connection on error, unless another call already replaced it
+                await reset_notebook_connection(notebook)
+                await asyncio.sleep(RETRY_BASE_DELAY * 2 ** attempt)
             else:
                 return [f"Error executing code cell after {max_retries} attempts: {str(e)}"]
+        except Exception as e:
+            logger.error("Error executing code cell: %s", e)
+            return [f"Error executing code cell: {str(e)}"]
+
+@mcp.tool()
+async def execute_code_transient(code: str) -> List[str]:
+    """Execute code directly in the kernel without adding a cell to the notebook.
+    
+    Args:
+        code: Python code to execute
+    
+    Returns:
+        list[str]: List of outputs from the execution
+    """
+    logger.info("Executing transient code")
+    try:
+        kernel_client = await ensure_kernel()
+        # Talk to the kernel channels directly, skipping the y-doc round-trip;
+        # the worker thread collects the outputs in a plain list
+        outputs = []
+        execution = asyncio.ensure_future(asyncio.to_thread(
+            kernel_client.execute_interactive,
+            code,
+            output_hook=partial(output_hook, outputs),
+            allow_stdin=False,
+            timeout=None,
+        ))
+        if not await wait_or_interrupt(kernel_client, execution):
+            logger.warning("Returning partial outputs of transient code")
+        str_outputs = [extract_output(output) for output in list(outputs)]
+        
+        logger.info("Transient execution complete, got %s outputs", len(str_outputs))
+        return str_outputs
+    except Exception as e:
+        logger.error("Error executing transient code: %s", e)
+        return [f"Error executing transient code: {str(e)}"]
 
 @mcp.tool()
-async def read_notebook_content() -> Dict[str, Any]:
+async def read_notebook_content() -> str:
     """Read the entire Jupyter notebook content.
     
     Returns:
-        dict: The notebook content structure containing cells and metadata
+        str: JSON encoded notebook content structure containing cells and metadata
     """
     logger.info("Reading notebook content")
     try:
         notebook = await ensure_notebook_connection()
         
-        # Get the y-document which contains the notebook content
-        ydoc = notebook._doc
+        # Concurrent readers wait for one build and share the same snapshot,
+        # which is only rebuilt once the notebook changed. It is kept JSON
+        # encoded so FastMCP sends it as is instead of encoding it again
+        global notebook_snapshot
+        async with snapshot_lock:
+            if notebook_snapshot is None or notebook_snapshot[0] != notebook_version:
+                version = notebook_version
+                content = await snapshot_notebook(notebook)
+                notebook_snapshot = (version, dump_json(content))
+                logger.info("Read %s cells from notebook", content["total_cells"])
+            return notebook_snapshot[1]
+    except Exception as e:
+        logger.error("Error reading notebook content: %s", e)
+        return dump_json({
+            "error": str(e),
+            "cells": [],
+            "total_cells": 0
+        })
+
+@mcp.tool()
+async def read_cells(
+    start: int = 0,
+    limit: int = 50,
+    include_outputs: bool = True,
+    last_outputs: int = 5,
+    include_images: bool = False,
+) -> str:
+    """Read a range of cells from the Jupyter notebook.
+    
+    Args:
+        start: Index of the first cell to read
+        limit: Maximum number of cells to read
+        include_outputs: Include the outputs of code cells
+        last_outputs: Number of most recent outputs kept per code cell
+        include_images: Return PNG images as {"image/png": <base64 data>} instead of a placeholder
+    
+    Returns:
+        str: JSON encoded cells of the range and the total number of cells
+    """
+    logger.info("Reading cells %s to %s", start, start + limit)
+    try:
+        notebook = await ensure_notebook_connection()
         
-        # Extract all cells
-        cells = []
-        for i in range(len(ydoc._ycells)):
-            cell_type = ydoc._ycells[i]["cell_type"]
-            cell_content = ydoc._ycells[i]["source"]
-            
-            # For code cells, include outputs
-            if cell_type == "code":
-                outputs = ydoc._ycells[i]["outputs"]
-                str_outputs = [extract_output(output) for output in outputs]
-                cells.append({
-                    "index": i,
-                    "type": cell_type,
-                    "content": cell_content,
-                    "outputs": str_outputs
-                })
-            else:
-                cells.append({
-                    "index": i,
-                    "type": cell_type,
-                    "content": cell_content
-                })
+        # Only the requested cells and outputs are read from the y-document
+        ycells = notebook._doc._ycells
+        total_cells = len(ycells)
+        extract = None
+        if include_outputs:
+            extract = extract_image_output if include_images else extract_output
+        cells = [
+            {"index": i, **serialize_cell(ycells[i], extract, last_outputs)}
+            for i in range(max(start, 0), min(start + limit, total_cells))
+        ]
         
-        logger.info(f"Read {len(cells)} cells from notebook")
-        return {
+        logger.info("Read %s cells from notebook", len(cells))
+        return dump_json({
             "cells": cells,
-            "total_cells": len(cells)
-        }
+            "total_cells": total_cells
+        })
     except Exception as e:
-        logger.error(f"Error reading notebook content: {str(e)}")
-        return {
+        logger.error("Error reading notebook cells: %s", e)
+        return dump_json({
             "error": str(e),
             "cells": [],
             "total_cells": 0
-        }
+        })
 
 @mcp.tool()
 async def kernel_restart() -> str:
@@ -270,44 +718,45 @@ async def kernel_restart() -> str:
     """
     logger.info("Restarting kernel")
     try:
-        global kernel, notebook_client
+        global kernel
         
-        # Stop current kernel
-        kernel.stop()
+        # Cached outputs belong to the previous kernel state
+        execution_cache.clear()
         
-        # Reset notebook client to force reconnection
-        if notebook_client:
-            try:
-                await notebook_client.stop()
-            except:
-                pass
-            notebook_client = None
+        # Stop current kernel, the notebook connection is independent and kept open
+        async with kernel_lock:
+            if kernel is not None:
+                await asyncio.to_thread(kernel.stop)
+                kernel = None
         
         # Start new kernel
-        kernel = KernelClient(server_url=SERVER_URL, token=TOKEN)
-        kernel.start()
+        await ensure_kernel()
         
         logger.info("Kernel restarted successfully")
         return "Jupyter kernel restarted successfully"
     except Exception as e:
-        logger.error(f"Error restarting kernel: {str(e)}")
+        logger.error("Error restarting kernel: %s", e)
         return f"Error restarting kernel: {str(e)}"
 
 async def cleanup_resources():
     """Clean up resources when shutting down."""
     logger.info("Cleaning up resources")
     
-    global notebook_client
-    if notebook_client:
-        try:
-            await notebook_client.stop()
-        except Exception as e:
-            logger.warning(f"Error stopping notebook client: {str(e)}")
+    await reset_notebook_connection(notebook_client)
     
-    kernel.stop()
+    if kernel is not None:
+        await asyncio.to_thread(kernel.stop)
     logger.info("Resources cleaned up")
 
 if __name__ == "__main__":
+    # uvloop speeds up the websocket and kernel message handling, optional
+    try:
+        import uvloop
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+        logger.info("Using uvloop event loop")
+    except ImportError:
+        pass
+
     try:
         logger.info("Starting Jupyter MCP server")
         # Try alternate transport methods if stdio fails
@@ -315,12 +764,12 @@ if __name__ == "__main__":
             logger.info("Attempting to run with stdio transport")
             mcp.run(transport='stdio')
         except Exception as e:
-            logger.error(f"Error using stdio transport: {str(e)}")
+            logger.error("Error using stdio transport: %s", e)
             logger.info("Falling back to TCP transport")
             # Fall back to TCP transport on a standard port (8050)
             mcp.run(transport='tcp', host='localhost', port=8050)
     except Exception as e:
-        logger.error(f"Fatal error in MCP server: {str(e)}")
+        logger.error("Fatal error in MCP server: %s", e)
         # Ensure cleanup happens
         asyncio.run(cleanup_resources())
         sys.exit(1)
\ No newline at end of file
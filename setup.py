@@ -0,0 +1,12 @@
+"""Builds the optional compiled output extraction hot path.
+
+    pip install mypy
+    python setup.py build_ext --inplace
+"""
+from setuptools import setup
+from mypyc.build import mypycify
+
+setup(
+    name="jupyter-mcp-fastpath",
+    ext_modules=mypycify(["_fastpath.py"]),
+)